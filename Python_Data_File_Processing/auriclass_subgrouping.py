@@ -1,8 +1,9 @@
-!/usr/bin/env python3
-import csv
+#!/usr/bin/env python3
 import subprocess
 import os
 import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 # Parse command-line arguments.
 parser = argparse.ArgumentParser(
@@ -39,57 +40,82 @@ allowed_clades = ["Clade I", "Clade II", "Clade III", "Clade IV", "Clade V", "Cl
 
 # Define the summary file name (now called Clade_designations.tab) within the clade directory.
 SUMMARY_FILE = os.path.join(CLADE_DIR, "Clade_designations.tab")
+SUMMARY_HEADER = "Isolate_ID\tClade"
 
-# Global dictionary to track which isolates have been added to each file.
+# Global dictionary to track which isolates are present in (or queued for) each file.
 # Keys are filenames and values are sets of Isolate_IDs.
-file_written_ids = {}
+seen_ids = {}
 
-def append_line_if_not_exists(filename, line, isolate_id, header_line=None):
+# Lines queued for each file, written in one batch per file by flush_pending_lines().
+pending_lines = defaultdict(list)
+
+def load_existing_ids(filename, header_line=None):
+    """
+    Load the Isolate_IDs already present in 'filename' into seen_ids.
+    If header_line is provided, it will be used to skip over a header line.
+    """
+    existing_ids = set()
+    if os.path.exists(filename):
+        # Read the whole file at once and split it in C rather than looping line by line.
+        with open(filename, "r", buffering=1 << 20) as f:
+            data = f.read()
+        header = header_line.strip() if header_line is not None else None
+        # Skip blank lines and the header; assume the first column is the Isolate_ID.
+        existing_ids = {
+            l.split("\t", 1)[0].strip()
+            for l in data.splitlines()
+            if l.strip() and l.strip() != header
+        }
+    seen_ids[filename] = existing_ids
+
+def append_line_if_not_exists(filename, line, isolate_id):
     """
-    Append 'line' to file 'filename' only if 'isolate_id' is not already present.
-    If header_line is provided, it will be used to skip over a header line when reading existing entries.
-    Returns True if the line was appended, False if it was skipped.
+    Queue 'line' for file 'filename' only if 'isolate_id' is not already present.
+    Existing files are preloaded at startup, so this does no disk I/O.
+    Queued lines are written by flush_pending_lines().
+    Returns True if the line was queued, False if it was skipped.
     """
-    # If we haven't yet loaded the file's content, load it.
-    if filename not in file_written_ids:
-        existing_ids = set()
-        if os.path.exists(filename):
-            with open(filename, "r") as f:
-                for l in f:
-                    if not l.strip():
-                        continue  # Skip blank lines.
-                    # Skip header if provided.
-                    if header_line is not None and l.strip() == header_line.strip():
-                        continue
-                    # Assume the first column is the Isolate_ID.
-                    existing_isolate = l.split("\t")[0].strip()
-                    existing_ids.add(existing_isolate)
-        file_written_ids[filename] = existing_ids
-
-    if isolate_id in file_written_ids[filename]:
+    # Any file not preloaded did not exist at startup, so it has no entries yet.
+    ids = seen_ids.setdefault(filename, set())
+    if isolate_id in ids:
         print(f"{isolate_id} already exists in {filename}. Skipping.")
         return False
     else:
-        with open(filename, "a") as out_f:
-            out_f.write(line)
-        file_written_ids[filename].add(isolate_id)
+        ids.add(isolate_id)
+        pending_lines[filename].append(line)
         return True
 
+def flush_pending_lines():
+    """Append all queued lines, opening each file once and writing its batch in one call."""
+    for filename, lines in pending_lines.items():
+        with open(filename, "a", buffering=1 << 20) as out_f:
+            out_f.write("".join(lines))
+    pending_lines.clear()
+
 # Create the summary file with header if it doesn't exist.
 if not os.path.exists(SUMMARY_FILE):
     with open(SUMMARY_FILE, "w") as summary_fh:
-        summary_fh.write("Isolate_ID\tClade\n")
-    file_written_ids[SUMMARY_FILE] = set()
+        summary_fh.write(f"{SUMMARY_HEADER}\n")
+
+# Load the existing summary and clade file entries up front in a single directory scan,
+# so isolates that are already classified can be skipped before auriclass is run for them
+# and the processing loop never has to read from disk.
+with os.scandir(CLADE_DIR) as entries:
+    for entry in entries:
+        if entry.path == SUMMARY_FILE:
+            load_existing_ids(entry.path, SUMMARY_HEADER)
+        elif entry.name.endswith((".reads.tab", ".contigs.tab")) and entry.is_file():
+            load_existing_ids(entry.path)
 
 # Load the reads file into a dictionary:
 # Format: { Isolate_ID: (reads1, reads2) }
 reads_dict = {}
 with open(READS_TAB, "r") as fh:
-    reader = csv.reader(fh, delimiter="\t")
-    for row in reader:
+    for line in fh.read().splitlines():
         # Skip empty or commented lines.
-        if not row or row[0].startswith("#"):
+        if not line.strip() or line[0] == "#":
             continue
+        row = line.split("\t")
         try:
             isolate_id, reads1, reads2 = row
         except ValueError:
@@ -101,10 +127,10 @@ with open(READS_TAB, "r") as fh:
 # Format: { Isolate_ID: contigs }
 contigs_dict = {}
 with open(CONTIGS_TAB, "r") as fh:
-    reader = csv.reader(fh, delimiter="\t")
-    for row in reader:
-        if not row or row[0].startswith("#"):
+    for line in fh.read().splitlines():
+        if not line.strip() or line[0] == "#":
             continue
+        row = line.split("\t")
         try:
             isolate_id, contigs = row
         except ValueError:
@@ -112,93 +138,110 @@ with open(CONTIGS_TAB, "r") as fh:
             continue
         contigs_dict[isolate_id] = contigs
 
-# Function to run auriclass on a given reads file and return the report path.
-def run_auriclass(reads1_path, isolate_id):
+# Function to build the auriclass command for a given reads file.
+# The report is written to stdout and captured, so concurrent runs never share an output file.
+def auriclass_command(reads1_path):
     # Construct the command; adjust parameters as needed.
-    cmd = ["auriclass", reads1_path]
-    print(f"Running auriclass for {isolate_id}: {' '.join(cmd)}")
+    return ["auriclass", "-o", "/dev/stdout", reads1_path]
+
+# Function to run auriclass and return (returncode, stdout, stderr).
+# This runs on worker threads, so it doesn't print; the main thread logs the result
+# alongside the rest of the sample's output.
+def run_auriclass(cmd):
     result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Error running auriclass for {isolate_id}:\n{result.stderr}")
+    return result.returncode, result.stdout, result.stderr
+
+# Function to parse the auriclass report text.
+# Assumes the report is tab-delimited with a header line,
+# and that the first data row contains the clade value in the second column.
+def parse_report_text(text):
+    lines = text.splitlines()
+    if not lines:
+        print("No header found in auriclass report")
         return None
-    # Assuming auriclass writes its output to a file named 'report.tsv' in the current directory.
-    report_path = "report.tsv"
-    if not os.path.exists(report_path):
-        print(f"Report file {report_path} not found for {isolate_id}")
+    # auriclass outputs one data row per run, after the header.
+    parts = lines[1].split("\t", 2) if len(lines) >= 2 else []
+    if len(parts) < 2:
+        print("auriclass report does not contain expected columns")
         return None
-    return report_path
+    clade = parts[1].strip()  # Extract clade from the second column.
+    print(f"Extracted clade: {clade}")
+    return clade
 
-# Function to parse the auriclass report.
-# Assumes the report is a tab-delimited file with headers,
-# and that the first data row contains the clade value in the second column.
-def parse_report(report_path):
-    with open(report_path, "r") as rep_fh:
-        reader = csv.reader(rep_fh, delimiter="\t")
-        # Read header row (assuming header exists).
-        header = next(reader, None)
-        if header is None:
-            print(f"No header found in {report_path}")
-            return None
-        # Read the first data row; auriclass outputs one row per run.
-        row = next(reader, None)
-        if row is None or len(row) < 2:
-            print(f"Report file {report_path} does not contain expected columns")
-            return None
-        clade = row[1].strip()  # Extract clade from the second column.
-        print(f"Extracted clade: {clade}")
-        return clade
-
-# Process each sample.
+# Run auriclass for all samples concurrently. subprocess.run releases the GIL while
+# waiting, so threads are enough to keep one auriclass process running per core.
+tasks = []
 for isolate_id, (reads1, reads2) in reads_dict.items():
-    print(f"\nProcessing sample {isolate_id} ...")
-    
-    # Run auriclass using the first reads file (reads1).
-    report_path = run_auriclass(reads1, isolate_id)
-    if report_path is None:
-        print(f"Skipping {isolate_id} due to auriclass error.")
-        continue
-
-    # Parse the report to extract the clade from the second column.
-    clade = parse_report(report_path)
-    if clade is None:
-        print(f"Skipping {isolate_id} because no clade was extracted.")
+    if isolate_id in seen_ids[SUMMARY_FILE]:
+        print(f"{isolate_id} already classified in {SUMMARY_FILE}, skipping.")
         continue
-
-    # Check if the clade is one of the allowed clades.
-    if clade not in allowed_clades:
-        print(f"Warning: Clade '{clade}' for {isolate_id} is not in the allowed list. Skipping sample.")
-        continue
-
-    # Prepare output file names for the clade.
-    # Replace spaces with underscores (e.g. "Clade III" becomes "Clade_III")
-    safe_clade = clade.replace(" ", "_")
-    clade_reads_file = os.path.join(CLADE_DIR, f"{safe_clade}.reads.tab")
-    clade_contigs_file = os.path.join(CLADE_DIR, f"{safe_clade}.contigs.tab")
-
-    # Prepare lines to append.
-    reads_line = f"{isolate_id}\t{reads1}\t{reads2}\n"
-    contigs_path = contigs_dict.get(isolate_id)
-    contigs_line = f"{isolate_id}\t{contigs_path}\n" if contigs_path else None
-    summary_line = f"{isolate_id}\t{clade}\n"
-
-    # Append the sample's reads entry to the clade-specific reads file if not already present.
-    append_line_if_not_exists(clade_reads_file, reads_line, isolate_id)
-
-    # Append the sample's contigs entry to the clade-specific contigs file if not already present.
-    if contigs_line:
-        append_line_if_not_exists(clade_contigs_file, contigs_line, isolate_id)
-    else:
-        print(f"Warning: No contigs entry found for {isolate_id}")
-
-    # Append the sample's result (Isolate_ID and Clade) to the summary file.
-    append_line_if_not_exists(SUMMARY_FILE, summary_line, isolate_id, header_line="Isolate_ID\tClade")
-
-    # Optionally, remove the temporary report file if not needed:
-    # os.remove(report_path)
-
-    print(f"Assigned sample {isolate_id} to {clade} and updated files:")
-    print(f"  - {clade_reads_file}")
-    print(f"  - {clade_contigs_file}")
-    print(f"  - {SUMMARY_FILE}")
+    tasks.append((isolate_id, reads1, reads2))
+max_workers = max(1, min(len(tasks), os.cpu_count() or 1))
+
+with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    futures = {}
+    for isolate_id, reads1, reads2 in tasks:
+        cmd = auriclass_command(reads1)
+        futures[executor.submit(run_auriclass, cmd)] = (isolate_id, reads1, reads2, cmd)
+
+    try:
+        # Process each sample in reads.tab order, so output files keep the input order.
+        # Results are handled here on the main thread only, so seen_ids and pending_lines have a single writer.
+        for future, (isolate_id, reads1, reads2, cmd) in futures.items():
+            print(f"\nProcessing sample {isolate_id} ...")
+
+            # Run auriclass using the first reads file (reads1).
+            print(f"Running auriclass for {isolate_id}: {' '.join(cmd)}")
+            returncode, report_text, stderr = future.result()
+            if returncode != 0:
+                print(f"Error running auriclass for {isolate_id}:\n{stderr}")
+                print(f"Skipping {isolate_id} due to auriclass error.")
+                continue
+
+            # Parse the report to extract the clade from the second column.
+            clade = parse_report_text(report_text)
+            if clade is None:
+                print(f"Skipping {isolate_id} because no clade was extracted.")
+                continue
+
+            # Check if the clade is one of the allowed clades.
+            if clade not in allowed_clades:
+                print(f"Warning: Clade '{clade}' for {isolate_id} is not in the allowed list. Skipping sample.")
+                continue
+
+            # Prepare output file names for the clade.
+            # Replace spaces with underscores (e.g. "Clade III" becomes "Clade_III")
+            safe_clade = clade.replace(" ", "_")
+            clade_reads_file = os.path.join(CLADE_DIR, f"{safe_clade}.reads.tab")
+            clade_contigs_file = os.path.join(CLADE_DIR, f"{safe_clade}.contigs.tab")
+
+            # Prepare lines to append.
+            reads_line = f"{isolate_id}\t{reads1}\t{reads2}\n"
+            contigs_path = contigs_dict.get(isolate_id)
+            contigs_line = f"{isolate_id}\t{contigs_path}\n" if contigs_path else None
+            summary_line = f"{isolate_id}\t{clade}\n"
+
+            # Append the sample's reads entry to the clade-specific reads file if not already present.
+            append_line_if_not_exists(clade_reads_file, reads_line, isolate_id)
+
+            # Append the sample's contigs entry to the clade-specific contigs file if not already present.
+            if contigs_line:
+                append_line_if_not_exists(clade_contigs_file, contigs_line, isolate_id)
+            else:
+                print(f"Warning: No contigs entry found for {isolate_id}")
+
+            # Append the sample's result (Isolate_ID and Clade) to the summary file.
+            append_line_if_not_exists(SUMMARY_FILE, summary_line, isolate_id)
+
+            print(f"Assigned sample {isolate_id} to {clade}; queued updates for:")
+            print(f"  - {clade_reads_file}")
+            print(f"  - {clade_contigs_file}")
+            print(f"  - {SUMMARY_FILE}")
+    finally:
+        # Write the queued lines to the clade and summary files, including when the
+        # loop is interrupted, so results already classified are kept for the next run.
+        flush_pending_lines()
+        # Don't start auriclass runs that are still queued if the loop was interrupted.
+        executor.shutdown(wait=False, cancel_futures=True)
 
 print("\nPipeline completed.")
\ No newline at end of file
@@ -14,7 +14,12 @@ Usage:
         --out-tree filtered.nwk
 """
 import argparse
-from Bio import SeqIO, Phylo
+import io
+import sys
+from Bio import Phylo
+
+# I/O buffer size for streaming large alignments and writing trees.
+BUFFER_SIZE = 4 << 20
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -48,30 +53,81 @@ def load_remove_list(path):
         return {line.strip() for line in f if line.strip()}
 
 def filter_alignment(in_fasta, out_fasta, remove_ids):
-    """Write sequences whose IDs are not in remove_ids."""
-    records = (
-        rec for rec in SeqIO.parse(in_fasta, 'fasta')
-        if rec.id not in remove_ids
-    )
-    SeqIO.write(records, out_fasta, 'fasta')
+    """Write sequences whose IDs are not in remove_ids.
+
+    Streams the FASTA as raw lines, copying each record verbatim unless
+    its ID (first word of the header) is in remove_ids.
+    Anything before the first header is dropped.
+    """
+    remove = {sid.encode() for sid in remove_ids}
+    keep = False
+    with open(in_fasta, 'rb', buffering=BUFFER_SIZE) as fi, \
+            open(out_fasta, 'wb', buffering=BUFFER_SIZE) as fo:
+        for line in fi:
+            if line.startswith(b'>'):
+                fields = line[1:].split(None, 1)
+                keep = not fields or fields[0] not in remove
+            if keep:
+                fo.write(line)
 
-def filter_tree(in_tree, out_tree, remove_ids):
-    """Prune tips with names in remove_ids and write new tree."""
-    tree = Phylo.read(in_tree, 'newick')
-    for tid in remove_ids:
-        try:
-            tree.prune(target=tid)
-        except ValueError:
-            # tip not found; skip
-            pass
-    Phylo.write(tree, out_tree, 'newick')
+def prune_tips(tree, remove_ids):
+    """Remove tips with names in remove_ids in a single post-order pass.
+
+    Mirrors Tree.prune: internal nodes left without children are dropped,
+    and nodes left with one child, including the root, are collapsed into
+    it (branch lengths summed). Raises ValueError if every tip is removed.
+    """
+    dropped = set()
+    shrunk = set()
+    for clade in list(tree.find_clades(order='postorder')):
+        if not clade.clades:
+            if clade.name in remove_ids:
+                dropped.add(id(clade))
+            continue
+        kept = []
+        for child in clade.clades:
+            if id(child) in dropped:
+                continue
+            if id(child) in shrunk and len(child.clades) == 1:
+                grandchild = child.clades[0]
+                if grandchild.branch_length is not None:
+                    grandchild.branch_length += child.branch_length or 0.0
+                child = grandchild
+            kept.append(child)
+        if len(kept) < len(clade.clades):
+            shrunk.add(id(clade))
+            if not kept:
+                dropped.add(id(clade))
+        clade.clades = kept
+    root = tree.root
+    if id(root) in dropped:
+        raise ValueError("All tips would be removed from the tree")
+    if id(root) in shrunk and len(root.clades) == 1:
+        new_root = root.clades[0]
+        if new_root.branch_length is not None:
+            new_root.branch_length += root.branch_length or 0.0
+        tree.root = new_root
+
+def filter_tree(tree, out_tree, remove_ids):
+    """Prune tips with names in remove_ids from a parsed tree and write it."""
+    prune_tips(tree, remove_ids)
+    buf = io.StringIO()
+    Phylo.write(tree, buf, 'newick')
+    # Write the serialized tree in a single call to a large binary buffer.
+    with open(out_tree, 'wb', buffering=BUFFER_SIZE) as f:
+        f.write(buf.getvalue().encode())
 
 def main():
     args = parse_args()
     remove_ids = load_remove_list(args.remove)
 
+    # Check the tree before writing either output, so nothing is left half-written.
+    tree = Phylo.read(args.tree, 'newick')
+    if all(tip.name in remove_ids for tip in tree.get_terminals()):
+        sys.exit(f"error: every tip in {args.tree} is in the remove list; nothing would be left")
+
     filter_alignment(args.alignment, args.out_aln, remove_ids)
-    filter_tree(args.tree, args.out_tree, remove_ids)
+    filter_tree(tree, args.out_tree, remove_ids)
 
 if __name__ == '__main__':  # noqa: C401
     main()